@@ -2,43 +2,76 @@
 import json
 import html
 import os
+import re
+import shutil
+import string
 import sys
 import unicodedata
 from datetime import date as Date, datetime, timedelta
+from functools import lru_cache
+from itertools import groupby
+from multiprocessing import Pool
+from operator import itemgetter
+from typing import Optional
 
 try:
     from zoneinfo import ZoneInfo
 except Exception:
     ZoneInfo = None
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class _SlugTable(dict):
+    def __missing__(self, cp: int) -> int:
+        v = cp if chr(cp).isalnum() else ord("-")
+        self[cp] = v
+        return v
+
+
+class _CombiningTable(dict):
+    def __missing__(self, cp: int) -> Optional[int]:
+        v = None if unicodedata.combining(chr(cp)) else cp
+        self[cp] = v
+        return v
+
 
+_SLUG_TABLE = _SlugTable({ord(c): ord(c) for c in string.ascii_lowercase + string.digits})
+_COMBINING_TABLE = _CombiningTable()
+_DASH_RE = re.compile(r"-+")
+
+ROW_TMPL = "<tr><td>{}</td><td>{}</td><td>{}</td></tr>".format
+EMPTY_ROW = ROW_TMPL("—", "—", "—")
+
+POOL_MIN_ROUTES = 500
+
+MMSS_SECONDS = {f"{m:02d}:{s:02d}": m * 60 + s for m in range(60) for s in range(60)}
+
+
+@lru_cache(maxsize=None)
 def slugify(s: str) -> str:
-    s = s.replace("–", "-").replace("—", "-")
-    s = unicodedata.normalize("NFKD", s)
-    s = "".join(ch for ch in s if not unicodedata.combining(ch))
-    s = s.lower().strip()
-
-    out = []
-    for ch in s:
-        if ch.isalnum():
-            out.append(ch)
-        elif ch in (" ", "-", "_"):
-            out.append("-")
-        else:
-            out.append("-")
-
-    slug = "".join(out)
-    while "--" in slug:
-        slug = slug.replace("--", "-")
-    return slug.strip("-") or "route"
+    s = unicodedata.normalize("NFKD", s).translate(_COMBINING_TABLE)
+    s = s.lower().strip().translate(_SLUG_TABLE)
+    return _DASH_RE.sub("-", s).strip("-") or "route"
 
 
+@lru_cache(maxsize=None)
 def route_filename(frm: str, to: str) -> str:
     return f"{slugify(frm)}-{slugify(to)}.html"
 
 
+@lru_cache(maxsize=1 << 16)
 def time_to_seconds(t: str) -> int:
     t = (t or "").strip()
+    ms = MMSS_SECONDS.get(t[-5:])
+    if ms is not None and t[-6:-5] == ":":
+        try:
+            return int(t[:-6]) * 3600 + ms
+        except ValueError:
+            pass
     if not t:
         return 10**9
     parts = t.split(":")
@@ -70,102 +103,57 @@ def today_sl() -> Date:
     return datetime.now(ZoneInfo("Europe/Ljubljana")).date()
 
 
-def delete_old_route_pages(out_dir: str):
-    for fn in os.listdir(out_dir):
-        if not fn.endswith(".html"):
-            continue
-        if fn in ("index.html", "routes.html"):
-            continue
-        p = os.path.join(out_dir, fn)
-        if os.path.isfile(p):
-            os.remove(p)
+def write_page(path: str, page: bytes):
+    with open(path, "wb") as f:
+        f.write(page)
 
 
-def resolve_input_path() -> str:
-    if len(sys.argv) >= 2 and (sys.argv[1] or "").strip():
-        return sys.argv[1].strip()
+_route_ctx: dict = {}
 
-    envp = (os.environ.get("OUT_JSON") or "").strip()
-    if envp:
-        return envp
 
-    for cand in ("gtfs_tmp/out.json", "out.json"):
-        if os.path.exists(cand):
-            return cand
+def init_route_worker(day_set: set, day_meta: list, nav_html: str):
+    _route_ctx.update(day_set=day_set, day_meta=day_meta, nav_html=nav_html)
 
-    return "gtfs_tmp/out.json"
 
+def render_route_page(route: tuple):
+    frm, to, entries = route
+    ctx = _route_ctx
 
-def main():
-    src_out_json = resolve_input_path()
-    if not os.path.exists(src_out_json):
-        print(f"Missing out.json: {src_out_json}", file=sys.stderr)
-        print("Usage: python scripts/build_pages.py <path-to-out.json>", file=sys.stderr)
-        sys.exit(2)
+    fn = route_filename(frm, to)
+    esc_frm = html.escape(frm)
+    esc_to = html.escape(to)
 
-    out_dir = os.getcwd()
+    day_rows = []
+    for e in entries:
+        dep = (e.get("departure_time") or "").strip() or "—"
+        arr = (e.get("arrival_time") or "").strip() or "—"
+        ag = (e.get("agency_name") or "").strip() or "—"
+        key = (time_to_seconds(dep), time_to_seconds(arr), ag, dep, arr)
 
-    with open(src_out_json, "r", encoding="utf-8") as f:
-        data = json.load(f)
+        for dk in (e.get("dates") or []):
+            if dk in ctx["day_set"]:
+                day_rows.append((dk, key))
 
-    with open(os.path.join(out_dir, "out.json"), "w", encoding="utf-8", newline="\n") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-        f.write("\n")
+    day_rows.sort()
+    per_day = {
+        dk: [row for row, _ in groupby(row for _, row in grp)]
+        for dk, grp in groupby(day_rows, key=itemgetter(0))
+    }
 
-    delete_old_route_pages(out_dir)
+    day_blocks = []
 
-    routes = []
-    for frm, tos in data.items():
-        for to, entries in tos.items():
-            routes.append((frm, to, entries))
-    routes.sort(key=lambda x: (x[0], x[1]))
+    for idx, (dk, esc_dk, esc_label) in enumerate(ctx["day_meta"]):
+        rows = per_day.get(dk, ())
+        body_rows = "".join(
+            ROW_TMPL(html.escape(dep), html.escape(arr), html.escape(ag))
+            for _, _, ag, dep, arr in rows
+        ) or EMPTY_ROW
+        open_attr = " open" if idx == 0 else ""
 
-    base = today_sl()
-    days = [base + timedelta(days=i) for i in range(10)]
-    day_keys = [yyyymmdd(d) for d in days]
-    day_set = set(day_keys)
-
-    for frm, to, entries in routes:
-        fn = route_filename(frm, to)
-
-        per_day = {k: {} for k in day_keys}
-        for e in entries:
-            dep = (e.get("departure_time") or "").strip() or "—"
-            arr = (e.get("arrival_time") or "").strip() or "—"
-            ag = (e.get("agency_name") or "").strip() or "—"
-            key = (dep, arr, ag)
-
-            for dk in (e.get("dates") or []):
-                if dk in day_set:
-                    per_day[dk][key] = True
-
-        nav = []
-        day_blocks = []
-
-        for idx, (d, dk) in enumerate(zip(days, day_keys)):
-            rows = list(per_day[dk].keys())
-            rows.sort(key=lambda r: (time_to_seconds(r[0]), time_to_seconds(r[1]), r[2]))
-
-            label = f"{day_name_sl(d)} {dd_mm(d)}"
-            nav.append(f'<li><a href="#d{html.escape(dk)}">{html.escape(label)}</a></li>')
-
-            tr = []
-            for dep, arr, ag in rows:
-                tr.append(
-                    "<tr>"
-                    f"<td>{html.escape(dep)}</td>"
-                    f"<td>{html.escape(arr)}</td>"
-                    f"<td>{html.escape(ag)}</td>"
-                    "</tr>"
-                )
-
-            body_rows = "".join(tr) if tr else "<tr><td>—</td><td>—</td><td>—</td></tr>"
-            open_attr = " open" if idx == 0 else ""
-
-            day_blocks.append(
-                f"""
-<details class="day" id="d{html.escape(dk)}"{open_attr}>
-  <summary>{html.escape(label)} ({len(rows)})</summary>
+        day_blocks.append(
+            f"""
+<details class="day" id="d{esc_dk}"{open_attr}>
+  <summary>{esc_label} ({len(rows)})</summary>
   <table border="1" cellpadding="6" cellspacing="0">
     <thead>
       <tr>
@@ -180,30 +168,111 @@ def main():
   </table>
 </details>
 """.strip()
-            )
+        )
 
-        page = f"""<!doctype html>
+    page = f"""<!doctype html>
 <html lang="sl">
   <head>
     <meta charset="utf-8" />
     <meta name="viewport" content="width=device-width,initial-scale=1" />
-    <title>{html.escape(frm)} – {html.escape(to)}</title>
+    <title>{esc_frm} – {esc_to}</title>
   </head>
   <body>
     <p><a href="./">← Nazaj</a></p>
-    <h1>{html.escape(frm)} – {html.escape(to)}</h1>
+    <h1>{esc_frm} – {esc_to}</h1>
 
     <p>Izberi dan (naslednjih 10 dni):</p>
     <ul>
-      {''.join(nav)}
+      {ctx["nav_html"]}
     </ul>
 
     {''.join(day_blocks)}
   </body>
 </html>
 """
-        with open(os.path.join(out_dir, fn), "w", encoding="utf-8", newline="\n") as f:
-            f.write(page)
+    return fn, page.encode("utf-8")
+
+
+def render_route_pages(routes: list, ctx: tuple):
+    workers = os.cpu_count() or 1
+    if workers == 1 or len(routes) < POOL_MIN_ROUTES:
+        init_route_worker(*ctx)
+        yield from map(render_route_page, routes)
+        return
+
+    with Pool(workers, initializer=init_route_worker, initargs=ctx) as p:
+        chunksize = max(1, len(routes) // (workers * 4))
+        yield from p.imap(render_route_page, routes, chunksize=chunksize)
+
+
+def delete_old_route_pages(out_dir: str):
+    for fn in os.listdir(out_dir):
+        if not fn.endswith(".html"):
+            continue
+        if fn in ("index.html", "routes.html"):
+            continue
+        p = os.path.join(out_dir, fn)
+        if os.path.isfile(p):
+            os.remove(p)
+
+
+def resolve_input_path() -> str:
+    if len(sys.argv) >= 2 and (sys.argv[1] or "").strip():
+        return sys.argv[1].strip()
+
+    envp = (os.environ.get("OUT_JSON") or "").strip()
+    if envp:
+        return envp
+
+    for cand in ("gtfs_tmp/out.json", "out.json"):
+        if os.path.exists(cand):
+            return cand
+
+    return "gtfs_tmp/out.json"
+
+
+def main():
+    src_out_json = resolve_input_path()
+    if not os.path.exists(src_out_json):
+        print(f"Missing out.json: {src_out_json}", file=sys.stderr)
+        print("Usage: python scripts/build_pages.py <path-to-out.json>", file=sys.stderr)
+        sys.exit(2)
+
+    out_dir = os.getcwd()
+
+    if orjson is not None:
+        with open(src_out_json, "rb") as f:
+            data = orjson.loads(f.read())
+    else:
+        with open(src_out_json, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+    dst_out_json = os.path.join(out_dir, "out.json")
+    if os.path.realpath(src_out_json) != os.path.realpath(dst_out_json):
+        shutil.copyfile(src_out_json, dst_out_json)
+
+    delete_old_route_pages(out_dir)
+
+    routes = sorted(
+        ((frm, to, entries) for frm, tos in data.items() for to, entries in tos.items()),
+        key=itemgetter(0, 1),
+    )
+
+    base = today_sl()
+    days = [base + timedelta(days=i) for i in range(10)]
+    day_keys = [yyyymmdd(d) for d in days]
+    day_set = set(day_keys)
+    day_meta = [
+        (dk, html.escape(dk), html.escape(f"{day_name_sl(d)} {dd_mm(d)}"))
+        for d, dk in zip(days, day_keys)
+    ]
+    nav_html = "".join(
+        f'<li><a href="#d{esc_dk}">{esc_label}</a></li>' for _, esc_dk, esc_label in day_meta
+    )
+
+    by_filename = {route_filename(frm, to): (frm, to, entries) for frm, to, entries in routes}
+    for fn, page in render_route_pages(list(by_filename.values()), (day_set, day_meta, nav_html)):
+        write_page(os.path.join(out_dir, fn), page)
 
     li = []
     for frm, to, _ in routes:
@@ -226,8 +295,7 @@ def main():
   </body>
 </html>
 """
-    with open(os.path.join(out_dir, "routes.html"), "w", encoding="utf-8", newline="\n") as f:
-        f.write(routes_html)
+    write_page(os.path.join(out_dir, "routes.html"), routes_html.encode("utf-8"))
 
     index_html = f"""<!doctype html>
 <html lang="sl">
@@ -248,8 +316,7 @@ def main():
   </body>
 </html>
 """
-    with open(os.path.join(out_dir, "index.html"), "w", encoding="utf-8", newline="\n") as f:
-        f.write(index_html)
+    write_page(os.path.join(out_dir, "index.html"), index_html.encode("utf-8"))
 
 
 if __name__ == "__main__":
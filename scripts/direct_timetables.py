@@ -4,9 +4,10 @@ import json
 import os
 import sys
 from collections import defaultdict
-from dataclasses import dataclass
-from datetime import date as Date, timedelta
-from typing import Dict, List, Optional, Set
+from dataclasses import dataclass, field
+from datetime import date as Date
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Set
 
 if hasattr(sys.stdout, "reconfigure"):
     sys.stdout.reconfigure(encoding="utf-8")
@@ -27,9 +28,14 @@ GTFS_FILES = {
 BUS_ROUTE_TYPE = "3"
 TRAIN_ROUTE_TYPE = "2"
 
+WEEKDAY_KEYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+
+MMSS_SECONDS = {f"{m:02d}:{s:02d}": m * 60 + s for m in range(60) for s in range(60)}
+
 
 def detect_encoding(path: str) -> str:
-    raw = open(path, "rb").read(8192)
+    with open(path, "rb") as f:
+        raw = f.read(8192)
     for enc in ("utf-8-sig", "utf-8", "cp1250", "iso-8859-2"):
         try:
             raw.decode(enc)
@@ -44,22 +50,48 @@ def open_csv(path: str):
     return open(path, "r", encoding=enc, newline="")
 
 
+def read_columns(path: str, *names: str):
+    with open_csv(path) as f:
+        r = csv.reader(f)
+        header = [h.strip() for h in next(r, [])]
+        idx = [header.index(n) if n in header else -1 for n in names]
+        width = max(idx) + 1
+        for row in r:
+            if not row:
+                continue
+            if len(row) < width:
+                row = row + [""] * (width - len(row))
+            yield tuple(row[i] if i >= 0 else "" for i in idx)
+
+
+@lru_cache(maxsize=None)
 def parse_yyyymmdd(s: str) -> Date:
     s = s.strip()
-    return Date(int(s[0:4]), int(s[4:6]), int(s[6:8]))
+    try:
+        return Date.fromisoformat(s)
+    except ValueError:
+        return Date(int(s[0:4]), int(s[4:6]), int(s[6:8]))
 
 
+@lru_cache(maxsize=None)
 def yyyymmdd(d: Date) -> str:
-    return f"{d.year:04d}{d.month:02d}{d.day:02d}"
+    return sys.intern(f"{d.year:04d}{d.month:02d}{d.day:02d}")
 
 
-def weekday_key(d: Date) -> str:
-    keys = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
-    return keys[d.weekday()]
+@lru_cache(maxsize=None)
+def ordinal_yyyymmdd(o: int) -> str:
+    return yyyymmdd(Date.fromordinal(o))
 
 
+@lru_cache(maxsize=1 << 16)
 def time_to_seconds(t: str) -> int:
     t = (t or "").strip()
+    ms = MMSS_SECONDS.get(t[-5:])
+    if ms is not None and t[-6:-5] == ":":
+        try:
+            return int(t[:-6]) * 3600 + ms
+        except ValueError:
+            pass
     if not t:
         return 10**9
     parts = t.split(":")
@@ -72,16 +104,14 @@ def time_to_seconds(t: str) -> int:
         return 10**9
 
 
-@dataclass(frozen=True)
-class Trip:
+class Trip(NamedTuple):
     trip_id: str
     route_id: str
     service_id: str
     trip_headsign: str
 
 
-@dataclass(frozen=True)
-class Route:
+class Route(NamedTuple):
     route_id: str
     agency_id: str
     route_short_name: str
@@ -89,23 +119,16 @@ class Route:
     route_type: str
 
 
-@dataclass
+@dataclass(slots=True)
 class ServiceDef:
     start: Optional[Date] = None
     end: Optional[Date] = None
-    dow: Optional[Dict[str, str]] = None
-    adds: Set[Date] = None
-    rems: Set[Date] = None
-
-    def __post_init__(self):
-        if self.adds is None:
-            self.adds = set()
-        if self.rems is None:
-            self.rems = set()
+    dow_mask: int = 0
+    adds: Set[int] = field(default_factory=set)
+    rems: Set[int] = field(default_factory=set)
 
 
-@dataclass(frozen=True)
-class Occ:
+class Occ(NamedTuple):
     stop_id: str
     station: str
     stop_type: Optional[int]
@@ -114,75 +137,83 @@ class Occ:
     dep: str
 
 
+@dataclass(slots=True)
+class TripOccs:
+    stop_ids: List[str] = field(default_factory=list)
+    stations: List[str] = field(default_factory=list)
+    stop_types: List[Optional[int]] = field(default_factory=list)
+    seqs: List[int] = field(default_factory=list)
+    arrs: List[str] = field(default_factory=list)
+    deps: List[str] = field(default_factory=list)
+
+    def add(self, stop_id: str, station: str, stop_type: Optional[int], seq: int, arr: str, dep: str):
+        self.stop_ids.append(stop_id)
+        self.stations.append(station)
+        self.stop_types.append(stop_type)
+        self.seqs.append(seq)
+        self.arrs.append(arr)
+        self.deps.append(dep)
+
+
 def load_type_mappings() -> Dict[str, int]:
     p = os.path.join(HERE, GTFS_FILES["type_mappings"])
     if not os.path.exists(p):
         return {}
     out: Dict[str, int] = {}
-    with open_csv(p) as f:
-        r = csv.DictReader(f)
-        for row in r:
-            sid = (row.get("stop_id") or "").strip()
-            t = (row.get("type") or "").strip()
-            if not sid or not t:
-                continue
-            try:
-                out[sid] = int(t)
-            except ValueError:
-                continue
+    for sid, t in read_columns(p, "stop_id", "type"):
+        sid = sid.strip()
+        t = t.strip()
+        if not sid or not t:
+            continue
+        try:
+            out[sid] = int(t)
+        except ValueError:
+            continue
     return out
 
 
 def load_stop_names() -> Dict[str, str]:
     p = os.path.join(HERE, GTFS_FILES["stops"])
     out: Dict[str, str] = {}
-    with open_csv(p) as f:
-        r = csv.DictReader(f)
-        for row in r:
-            out[row["stop_id"]] = row.get("stop_name", "") or ""
+    for stop_id, stop_name in read_columns(p, "stop_id", "stop_name"):
+        out[stop_id] = sys.intern(stop_name)
     return out
 
 
 def load_agencies() -> Dict[str, str]:
     p = os.path.join(HERE, GTFS_FILES["agency"])
     out: Dict[str, str] = {}
-    with open_csv(p) as f:
-        r = csv.DictReader(f)
-        for row in r:
-            out[row["agency_id"]] = row.get("agency_name", "") or ""
+    for agency_id, agency_name in read_columns(p, "agency_id", "agency_name"):
+        out[agency_id] = sys.intern(agency_name)
     return out
 
 
 def load_routes() -> Dict[str, Route]:
     p = os.path.join(HERE, GTFS_FILES["routes"])
     out: Dict[str, Route] = {}
-    with open_csv(p) as f:
-        r = csv.DictReader(f)
-        for row in r:
-            rid = row["route_id"]
-            out[rid] = Route(
-                route_id=rid,
-                agency_id=row.get("agency_id", "") or "",
-                route_short_name=row.get("route_short_name", "") or "",
-                route_long_name=row.get("route_long_name", "") or "",
-                route_type=row.get("route_type", "") or "",
-            )
+    cols = ("route_id", "agency_id", "route_short_name", "route_long_name", "route_type")
+    for rid, agency_id, short_name, long_name, route_type in read_columns(p, *cols):
+        out[rid] = Route(
+            route_id=rid,
+            agency_id=sys.intern(agency_id),
+            route_short_name=sys.intern(short_name),
+            route_long_name=sys.intern(long_name),
+            route_type=sys.intern(route_type),
+        )
     return out
 
 
 def load_trips() -> Dict[str, Trip]:
     p = os.path.join(HERE, GTFS_FILES["trips"])
     out: Dict[str, Trip] = {}
-    with open_csv(p) as f:
-        r = csv.DictReader(f)
-        for row in r:
-            tid = row["trip_id"]
-            out[tid] = Trip(
-                trip_id=tid,
-                route_id=row.get("route_id", "") or "",
-                service_id=row.get("service_id", "") or "",
-                trip_headsign=row.get("trip_headsign", "") or "",
-            )
+    cols = ("trip_id", "route_id", "service_id", "trip_headsign")
+    for tid, route_id, service_id, headsign in read_columns(p, *cols):
+        out[tid] = Trip(
+            trip_id=tid,
+            route_id=route_id,
+            service_id=service_id,
+            trip_headsign=headsign,
+        )
     return out
 
 
@@ -190,67 +221,65 @@ def load_services() -> Dict[str, ServiceDef]:
     services: Dict[str, ServiceDef] = {}
 
     p = os.path.join(HERE, GTFS_FILES["calendar"])
-    with open_csv(p) as f:
-        r = csv.DictReader(f)
-        for row in r:
-            sid = row["service_id"]
-            sd = services.get(sid) or ServiceDef()
-            sd.start = parse_yyyymmdd(row["start_date"])
-            sd.end = parse_yyyymmdd(row["end_date"])
-            sd.dow = {
-                "monday": row.get("monday", "0"),
-                "tuesday": row.get("tuesday", "0"),
-                "wednesday": row.get("wednesday", "0"),
-                "thursday": row.get("thursday", "0"),
-                "friday": row.get("friday", "0"),
-                "saturday": row.get("saturday", "0"),
-                "sunday": row.get("sunday", "0"),
-            }
-            services[sid] = sd
+    cols = ("service_id", "start_date", "end_date") + WEEKDAY_KEYS
+    for row in read_columns(p, *cols):
+        sid = row[0]
+        sd = services.get(sid) or ServiceDef()
+        sd.start = parse_yyyymmdd(row[1])
+        sd.end = parse_yyyymmdd(row[2])
+        sd.dow_mask = sum((v == "1") << i for i, v in enumerate(row[3:]))
+        services[sid] = sd
 
     p = os.path.join(HERE, GTFS_FILES["calendar_dates"])
-    with open_csv(p) as f:
-        r = csv.DictReader(f)
-        for row in r:
-            sid = row["service_id"]
-            d = parse_yyyymmdd(row["date"])
-            et = row.get("exception_type", "")
-            sd = services.get(sid) or ServiceDef()
-            if et == "1":
-                sd.adds.add(d)
-            elif et == "2":
-                sd.rems.add(d)
-            services[sid] = sd
+    for sid, ds, et in read_columns(p, "service_id", "date", "exception_type"):
+        d = parse_yyyymmdd(ds).toordinal()
+        sd = services.get(sid) or ServiceDef()
+        if et == "1":
+            sd.adds.add(d)
+        elif et == "2":
+            sd.rems.add(d)
+        services[sid] = sd
 
     return services
 
 
 def dates_for_service(sd: ServiceDef) -> List[str]:
-    if sd.start is None or sd.end is None or sd.dow is None:
-        ds = sorted([d for d in sd.adds if d not in sd.rems])
-        return [yyyymmdd(d) for d in ds]
+    if sd.start is None or sd.end is None:
+        return [ordinal_yyyymmdd(o) for o in sorted(sd.adds - sd.rems)]
 
-    out: Set[Date] = set()
-    d = sd.start
-    while d <= sd.end:
-        if sd.dow.get(weekday_key(d), "0") == "1":
-            out.add(d)
-        d += timedelta(days=1)
+    start = sd.start.toordinal()
+    end = sd.end.toordinal()
+    start_wd = sd.start.weekday()
+
+    out: Set[int] = set()
+    for wd in range(7):
+        if (sd.dow_mask >> wd) & 1:
+            out.update(range(start + (wd - start_wd) % 7, end + 1, 7))
 
     out |= sd.adds
     out -= sd.rems
-    return [yyyymmdd(d) for d in sorted(out)]
+    return [ordinal_yyyymmdd(o) for o in sorted(out)]
 
 
-def reduce_station_sequence(occs: List[Occ]) -> List[Occ]:
-    occs = sorted(occs, key=lambda o: o.seq)
+def reduce_station_sequence(occs: TripOccs) -> List[Occ]:
+    order = sorted(range(len(occs.seqs)), key=occs.seqs.__getitem__)
     reduced: List[Occ] = []
     last_station = None
-    for o in occs:
-        if o.station == last_station:
+    for i in order:
+        station = occs.stations[i]
+        if station == last_station:
             continue
-        reduced.append(o)
-        last_station = o.station
+        reduced.append(
+            Occ(
+                stop_id=occs.stop_ids[i],
+                station=station,
+                stop_type=occs.stop_types[i],
+                seq=occs.seqs[i],
+                arr=occs.arrs[i],
+                dep=occs.deps[i],
+            )
+        )
+        last_station = station
     return reduced
 
 
@@ -285,7 +314,7 @@ def main():
     trips = load_trips()
     services = load_services()
 
-    allowed_stop_ids = set(stop_ids)
+    allowed_stop_ids = frozenset(map(sys.intern, stop_ids))
     service_dates_cache: Dict[str, List[str]] = {}
 
     def get_service_dates(service_id: str) -> List[str]:
@@ -296,35 +325,45 @@ def main():
         service_dates_cache[service_id] = ds
         return ds
 
-    trip_occs: Dict[str, List[Occ]] = defaultdict(list)
+    trip_occs: Dict[str, TripOccs] = defaultdict(TripOccs)
 
     stop_times_path = os.path.join(HERE, GTFS_FILES["stop_times"])
     with open_csv(stop_times_path) as f:
-        r = csv.DictReader(f)
+        r = csv.reader(f)
+        header = [h.strip() for h in next(r, [])]
+        idx_stop_id = header.index("stop_id")
+        idx_trip_id = header.index("trip_id")
+        idx_seq = header.index("stop_sequence")
+        idx_arr = header.index("arrival_time")
+        idx_dep = header.index("departure_time")
+        width = max(idx_stop_id, idx_trip_id, idx_seq, idx_arr, idx_dep) + 1
+
         for row in r:
-            sid = (row.get("stop_id") or "").strip()
+            if len(row) < width:
+                if not row:
+                    continue
+                row += [""] * (width - len(row))
+
+            sid = row[idx_stop_id]
             if sid not in allowed_stop_ids:
                 continue
 
-            trip_id = (row.get("trip_id") or "").strip()
+            trip_id = row[idx_trip_id].strip()
             if not trip_id:
                 continue
 
-            seq_raw = (row.get("stop_sequence") or "").strip()
             try:
-                seq = int(seq_raw)
+                seq = int(row[idx_seq])
             except ValueError:
                 continue
 
-            trip_occs[trip_id].append(
-                Occ(
-                    stop_id=sid,
-                    station=stop_names[sid],
-                    stop_type=type_map.get(sid),
-                    seq=seq,
-                    arr=(row.get("arrival_time") or "").strip(),
-                    dep=(row.get("departure_time") or "").strip(),
-                )
+            trip_occs[trip_id].add(
+                sid,
+                stop_names[sid],
+                type_map.get(sid),
+                seq,
+                row[idx_arr].strip(),
+                row[idx_dep].strip(),
             )
 
     result: Dict[str, Dict[str, List[dict]]] = {}